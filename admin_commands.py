@@ -7,16 +7,53 @@ Fixes:
 """
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions, PostgrestAPIError
 import os
+import re
+import html
+import asyncio
+import functools
+import logging
 import secrets
-from datetime import datetime
-import requests
+from datetime import datetime, timezone
+import httpx
+from cachetools import TTLCache
 
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+logger = logging.getLogger(__name__)
+
+# Fail fast on connect so a stalled Supabase doesn't tie up worker threads
+SUPABASE_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+@functools.lru_cache(maxsize=1)
+def _sb() -> Client:
+    """Supabase client, created on first use"""
+    return create_client(
+        os.environ['SUPABASE_URL'],
+        os.environ['SUPABASE_KEY'],
+        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+    )
+
+# Admin records rarely change, so keep per-user lookups in memory instead of querying on every update
+_ADMIN_CACHE = TTLCache(maxsize=1024, ttl=60)
+
+# Settings and packages change far less often than they are read
+_SETTINGS_CACHE = TTLCache(maxsize=1, ttl=300)
+_PACKAGES_CACHE = TTLCache(maxsize=1, ttl=120)
+
+# Callbacks registered by other modules (bot.py) to drop their own copies when admins edit config
+_CONFIG_LISTENERS = {}
+
+# Dashboard counts tolerate brief staleness
+_STATS_CACHE = TTLCache(maxsize=1, ttl=30)
+_STATS_KEYS = frozenset({'users', 'tokens', 'active_tokens', 'keys', 'pending'})
+
+# Shared async HTTP client so verification reuses connections without blocking the event loop
+_ASYNC_HTTP = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16)
+)
 
 # Conversation states for admin
 (ADMIN_WAITING_USERNAME, ADMIN_WAITING_PACKAGE, ADMIN_WAITING_TXN,
@@ -24,53 +61,250 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
  ADMIN_ADD_PKG_NAME, ADMIN_ADD_PKG_DESC, ADMIN_ADD_PKG_AMOUNT, ADMIN_ADD_PKG_VALIDITY,
  ADMIN_EDIT_CHANNEL, ADMIN_EDIT_API) = range(20, 33)
 
-def get_all_admins():
-    """Get all admin IDs"""
-    result = supabase.table('admins').select('telegram_id').eq('is_active', True).execute()
-    return [admin['telegram_id'] for admin in result.data] if result.data else []
+# Static message texts (HTML)
+_LIMITED_PANEL_TEXT = "🔓 <b>Limited Admin Panel</b>\n\nSelect an option:"
+_SUPER_PANEL_TEXT = "🔑 <b>Super Admin Panel</b>\n\nSelect an option:"
+_STATS_TEMPLATE = (
+    "📊 <b>Statistics</b>\n\n"
+    "👥 Total Users: {users}\n"
+    "🎟 Total Tokens: {tokens}\n"
+    "✅ Active Tokens: {active_tokens}\n"
+    "🔑 Total Keys: {keys}\n"
+    "⏳ Pending Reviews: {pending}"
+)
+
+# Static keyboards, built once at import
+_LIMITED_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
+    [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
+    [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
+])
+
+_SUPER_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
+    [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
+    [InlineKeyboardButton("📦 Manage Packages", callback_data="admin_packages")],
+    [InlineKeyboardButton("💳 Manage UPI", callback_data="admin_upi")],
+    [InlineKeyboardButton("👥 Manage Admins", callback_data="admin_admins")],
+    [InlineKeyboardButton("⚙️ Bot Settings", callback_data="admin_settings")],
+    [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
+])
+
+_PACKAGES_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add Package", callback_data="admin_add_package")],
+    [InlineKeyboardButton("📋 View Packages", callback_data="admin_view_packages")],
+    [InlineKeyboardButton("« Back", callback_data="admin_back")]
+])
+
+_UPI_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add UPI", callback_data="admin_add_upi")],
+    [InlineKeyboardButton("📋 View UPI", callback_data="admin_view_upi")],
+    [InlineKeyboardButton("« Back", callback_data="admin_back")]
+])
+
+_ADMINS_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add Admin", callback_data="admin_add_admin")],
+    [InlineKeyboardButton("📋 View Admins", callback_data="admin_view_admins")],
+    [InlineKeyboardButton("« Back", callback_data="admin_back")]
+])
+
+_SETTINGS_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Edit Force Channel", callback_data="admin_edit_channel")],
+    [InlineKeyboardButton("🔑 Edit API Token", callback_data="admin_edit_api")],
+    [InlineKeyboardButton("📋 View Settings", callback_data="admin_view_settings")],
+    [InlineKeyboardButton("« Back", callback_data="admin_back")]
+])
+
+# Main panel text and keyboard per admin role
+_PANELS = {
+    'limited': (_LIMITED_PANEL_TEXT, _LIMITED_MARKUP),
+    'super': (_SUPER_PANEL_TEXT, _SUPER_MARKUP)
+}
+
+_BACK_TO_PANEL_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="admin_back")]])
+
+_BACK_TO_PACKAGES_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="admin_packages")]])
+
+_BACK_TO_UPI_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="admin_upi")]])
+
+_BACK_TO_ADMINS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="admin_admins")]])
+
+_BACK_TO_SETTINGS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="admin_settings")]])
+
+def _now_iso():
+    """Current UTC time as an ISO-8601 string"""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def on_config_change(table, callback):
+    """Register a callback to run after an admin edits the given config table"""
+    _CONFIG_LISTENERS.setdefault(table, []).append(callback)
 
-def is_admin(user_id):
-    """Check if user is admin"""
-    return user_id in get_all_admins()
+def config_changed(table):
+    """Run the callbacks registered for a config table"""
+    for callback in _CONFIG_LISTENERS.get(table, ()):
+        callback()
+
+def clear_cached_table(table):
+    """Drop this module's cached copy of a config table, if it keeps one"""
+    cache = {'admins': _ADMIN_CACHE, 'bot_settings': _SETTINGS_CACHE, 'packages': _PACKAGES_CACHE}.get(table)
+    if cache is not None:
+        cache.clear()
+
+def get_admin_record(user_id):
+    """Get active admin row - returns None if not an admin (cached)"""
+    record = _ADMIN_CACHE.get(user_id)
+    if record is None:
+        result = _sb().table('admins').select('telegram_id, role').eq('telegram_id', user_id).eq('is_active', True).limit(1).execute()
+        # Cache non-admins as {} so they don't hit the database on every update either
+        record = result.data[0] if result.data else {}
+        _ADMIN_CACHE[user_id] = record
+    return record or None
 
 def get_admin_role(user_id):
-    """Get admin role - returns 'super' or 'limited'"""
-    result = supabase.table('admins').select('role').eq('telegram_id', user_id).eq('is_active', True).execute()
-    if result.data:
-        return result.data[0].get('role', 'limited')
+    """Get admin role - returns 'super', 'limited' or None if not an admin"""
+    record = get_admin_record(user_id)
+    if record is None:
+        return None
+    return record.get('role') or 'limited'
+
+async def get_settings():
+    """Get bot settings (cached)"""
+    settings = _SETTINGS_CACHE.get('settings')
+    if settings is None:
+        result = await run_query(_sb().table('bot_settings').select('id, force_channel, api_token').limit(1))
+        settings = result.data[0] if result.data else {}
+        _SETTINGS_CACHE['settings'] = settings
+    return settings or None
+
+async def setting_upsert(field, value):
+    """Build the upsert for a single bot setting (reads the cached row id)"""
+    settings = await get_settings()
+    settings_id = settings['id'] if settings else 1
+    return _sb().table('bot_settings').upsert({'id': settings_id, field: value}, on_conflict='id')
+
+async def save_setting(field, value):
+    """Update a single bot setting with one upsert"""
+    await run_query(await setting_upsert(field, value))
+    _SETTINGS_CACHE.clear()
+    config_changed('bot_settings')
+
+async def persist_setting(field, value):
+    """Save a bot setting in the background, logging failures"""
+    # Only the request runs in the worker thread - the cache is touched on the event loop
+    try:
+        await run_query(await setting_upsert(field, value))
+    except Exception as e:
+        logger.error(f"Failed to save setting {field}: {e}")
+        return
+    _SETTINGS_CACHE.clear()
+    config_changed('bot_settings')
+
+def get_packages(active_only=True):
+    """Get packages, optionally only active ones (cached)"""
+    packages = _PACKAGES_CACHE.get('packages')
+    if packages is None:
+        packages = _sb().table('packages').select('id, plan_name, description, amount, validity, is_active').execute().data
+        _PACKAGES_CACHE['packages'] = packages
+    if active_only:
+        return [pkg for pkg in packages if pkg['is_active']]
+    return packages
+
+def get_package(package_id):
+    """Get specific package (cached)"""
+    for pkg in get_packages(active_only=False):
+        if pkg['id'] == package_id:
+            return pkg
     return None
 
-def is_super_admin(user_id):
-    """Check if user is super admin"""
-    return get_admin_role(user_id) == 'super'
+def require_admin(super_only=False):
+    """Restrict a handler to admins (or super admins only) and store the role in user_data"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            role = get_admin_role(update.effective_user.id)
+            
+            if role is None or (super_only and role != 'super'):
+                text = "❌ Unauthorized! Super admin access only." if super_only else "❌ Unauthorized! Admin access only."
+                if update.callback_query:
+                    await update.callback_query.answer()
+                    await update.callback_query.message.reply_text(text)
+                else:
+                    await update.message.reply_text(text)
+                return ConversationHandler.END
+            
+            context.user_data['_admin_role'] = role
+            return await handler(update, context)
+        return wrapper
+    return decorator
+
+async def run_query(query):
+    """Execute a Supabase query in a worker thread so the event loop isn't blocked"""
+    return await asyncio.to_thread(query.execute)
+
+async def count_rows(table, count='exact', **filters):
+    """Count rows in a table matching the given equality filters"""
+    query = _sb().table(table).select('*', count=count, head=True)
+    for column, value in filters.items():
+        query = query.eq(column, value)
+    return (await run_query(query)).count
+
+async def fetch_stats():
+    """Get dashboard counts via the get_admin_stats RPC, falling back to count queries"""
+    try:
+        stats = (await run_query(_sb().rpc('get_admin_stats'))).data
+        if isinstance(stats, dict) and _STATS_KEYS <= stats.keys():
+            return stats
+        logger.warning(f"get_admin_stats RPC returned unexpected data, falling back to count queries: {stats!r}")
+    except PostgrestAPIError as e:
+        logger.warning(f"get_admin_stats RPC failed, falling back to count queries: {e}")
+    
+    # Estimated counts avoid full scans on the large tables; filtered counts must stay exact
+    users, tokens, active_tokens, keys, pending = await asyncio.gather(
+        count_rows('users', count='estimated'),
+        count_rows('tokens', count='estimated'),
+        count_rows('tokens', status='active'),
+        count_rows('keys', count='estimated'),
+        count_rows('pending_transactions', status='pending')
+    )
+    return {'users': users, 'tokens': tokens, 'active_tokens': active_tokens, 'keys': keys, 'pending': pending}
 
-def is_transaction_used(transaction_id):
+async def get_stats():
+    """Get dashboard counts (cached)"""
+    stats = _STATS_CACHE.get('stats')
+    if stats is None:
+        stats = await fetch_stats()
+        # Don't pin a partial result (a count can come back as None) for the whole TTL
+        if all(stats[key] is not None for key in _STATS_KEYS):
+            _STATS_CACHE['stats'] = stats
+    return stats
+
+async def is_transaction_used(transaction_id):
     """Check if transaction ID is already used"""
-    result = supabase.table('tokens').select('transaction_id').eq('transaction_id', transaction_id).execute()
+    result = await run_query(_sb().table('tokens').select('transaction_id').eq('transaction_id', transaction_id).limit(1))
     return len(result.data) > 0 if result.data else False
 
-def verify_transaction(transaction_id, expected_amount):
+async def verify_transaction(transaction_id, expected_amount):
     """Verify transaction via API"""
     # FIRST: Check if transaction ID already used
-    if is_transaction_used(transaction_id):
+    if await is_transaction_used(transaction_id):
         return {
             'status': 'FAILED',
             'message': 'This Transaction ID has already been used!'
         }
     
-    settings = supabase.table('bot_settings').select('*').limit(1).execute().data
+    settings = await get_settings()
     
-    if not settings or not settings[0].get('api_token'):
+    if not settings or not settings.get('api_token'):
         return {'status': 'ERROR', 'message': 'API configuration not found'}
     
-    api_token = settings[0]['api_token']
+    api_token = settings['api_token']
     url = f"https://api.intechost.com/bharatpe/api.php?token={api_token}&txn_id={transaction_id}"
     
     try:
-        response = requests.get(url, timeout=10)
+        response = await _ASYNC_HTTP.get(url)
         data = response.json()
         
-        if data.get('status') == 'SUCCESS' and float(data.get('amount', 0)) == float(expected_amount):
+        if data.get('status') == 'SUCCESS' and abs(float(data.get('amount', 0)) - float(expected_amount)) < 0.01:
             return {
                 'status': 'SUCCESS',
                 'amount': data.get('amount'),
@@ -86,57 +320,19 @@ def verify_transaction(transaction_id, expected_amount):
         return {'status': 'ERROR', 'message': str(e)}
 
 # === ADMIN PANEL ===
+@require_admin()
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main admin panel"""
-    user_id = update.effective_user.id
-    
-    if not is_admin(user_id):
-        await update.message.reply_text("❌ Unauthorized! Admin access only.")
-        return
-    
-    role = get_admin_role(user_id)
-    
-    if role == 'limited':
-        keyboard = [
-            [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
-            [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
-            [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "🔓 *Limited Admin Panel*\n\nSelect an option:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    else:
-        keyboard = [
-            [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
-            [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
-            [InlineKeyboardButton("📦 Manage Packages", callback_data="admin_packages")],
-            [InlineKeyboardButton("💳 Manage UPI", callback_data="admin_upi")],
-            [InlineKeyboardButton("👥 Manage Admins", callback_data="admin_admins")],
-            [InlineKeyboardButton("⚙️ Bot Settings", callback_data="admin_settings")],
-            [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "🔑 *Super Admin Panel*\n\nSelect an option:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+    text, reply_markup = _PANELS.get(context.user_data['_admin_role'], _PANELS['super'])
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
 
 # === MANUAL TOKEN GENERATION (WITH TRANSACTION VERIFICATION) ===
+@require_admin()
 async def admin_generate_token_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start manual token generation"""
     query = update.callback_query
     await query.answer()
     
-    if not is_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "👤 *Manual Token Generation*\n\n"
         "Enter username (with or without @):",
@@ -150,12 +346,14 @@ async def admin_receive_username(update: Update, context: ContextTypes.DEFAULT_T
     username = update.message.text.strip().replace('@', '')
     context.user_data['admin_target_username'] = username
     
-    packages = supabase.table('packages').select('*').eq('is_active', True).execute().data
+    packages = get_packages()
     
     if not packages:
         await update.message.reply_text("❌ No packages available!")
         return ConversationHandler.END
     
+    context.user_data['admin_packages_by_id'] = {pkg['id']: pkg for pkg in packages}
+    
     keyboard = []
     for pkg in packages:
         keyboard.append([InlineKeyboardButton(
@@ -178,10 +376,16 @@ async def admin_select_package(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    package_id = int(query.data.split('_')[2])
+    package_id = int(context.matches[0].group('package_id'))
     context.user_data['admin_package_id'] = package_id
     
-    package = supabase.table('packages').select('*').eq('id', package_id).execute().data[0]
+    package = context.user_data.get('admin_packages_by_id', {}).get(package_id) or get_package(package_id)
+    
+    if not package:
+        await query.message.reply_text("❌ Package not found!")
+        return ConversationHandler.END
+    
+    context.user_data['admin_package'] = package
     
     await query.message.reply_text(
         f"📦 Package: {package['plan_name']}\n"
@@ -197,13 +401,16 @@ async def admin_receive_transaction(update: Update, context: ContextTypes.DEFAUL
     txn_id = update.message.text.strip()
     username = context.user_data.get('admin_target_username')
     package_id = context.user_data.get('admin_package_id')
+    package = context.user_data.get('admin_package')
     
-    package = supabase.table('packages').select('*').eq('id', package_id).execute().data[0]
+    if not package:
+        await update.message.reply_text("❌ Package not found!")
+        return ConversationHandler.END
     
     await update.message.reply_text("⏳ Verifying transaction...")
     
     # Verify transaction
-    result = verify_transaction(txn_id, package['amount'])
+    result = await verify_transaction(txn_id, package['amount'])
     
     if result['status'] == 'SUCCESS':
         # Generate token after successful verification
@@ -216,11 +423,11 @@ async def admin_receive_transaction(update: Update, context: ContextTypes.DEFAUL
             'package_id': package_id,
             'transaction_id': txn_id,
             'amount': package['amount'],
-            'status': 'active',
-            'created_at': datetime.utcnow().isoformat()
+            'status': 'active'
         }
         
-        supabase.table('tokens').insert(data).execute()
+        _sb().table('tokens').insert(data).execute()
+        _STATS_CACHE.clear()
         
         await update.message.reply_text(
             f"✅ *Token Generated Successfully!*\n\n"
@@ -247,16 +454,15 @@ async def admin_receive_transaction(update: Update, context: ContextTypes.DEFAUL
     return ConversationHandler.END
 
 # === PENDING REVIEWS ===
+@require_admin()
 async def admin_view_pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View pending reviews"""
     query = update.callback_query
     await query.answer()
     
-    if not is_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return
-    
-    pending = supabase.table('pending_transactions').select('*').eq('status', 'pending').execute().data
+    pending = _sb().table('pending_transactions').select(
+        'id, user_id, username, package_id, screenshot_file_id, created_at'
+    ).eq('status', 'pending').execute().data
     
     if not pending:
         await query.message.reply_text("✅ No pending reviews!")
@@ -264,8 +470,13 @@ async def admin_view_pending(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     await query.message.reply_text(f"📋 *Pending Reviews: {len(pending)}*\n\nFetching...", parse_mode='Markdown')
     
-    for transaction in pending:
-        package = supabase.table('packages').select('*').eq('id', transaction['package_id']).execute().data[0]
+    packages_by_id = {pkg['id']: pkg for pkg in get_packages(active_only=False)}
+    
+    # Limit concurrent sends to stay well within Telegram flood limits
+    semaphore = asyncio.Semaphore(5)
+    
+    async def send_review(transaction):
+        package = packages_by_id[transaction['package_id']]
         
         keyboard = [
             [InlineKeyboardButton("✅ Approve", callback_data=f"approve_{transaction['id']}")],
@@ -273,41 +484,49 @@ async def admin_view_pending(update: Update, context: ContextTypes.DEFAULT_TYPE)
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_photo(
-            chat_id=update.effective_user.id,
-            photo=transaction['screenshot_file_id'],
-            caption=(
-                f"📸 *Pending Review*\n\n"
-                f"👤 Username: @{transaction['username']}\n"
-                f"🆔 User ID: `{transaction['user_id']}`\n"
-                f"📦 Package: {package['plan_name']}\n"
-                f"💰 Amount: ₹{package['amount']}\n"
-                f"📅 Submitted: {transaction['created_at']}"
-            ),
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+        async with semaphore:
+            await context.bot.send_photo(
+                chat_id=update.effective_user.id,
+                photo=transaction['screenshot_file_id'],
+                caption=(
+                    f"📸 *Pending Review*\n\n"
+                    f"👤 Username: @{transaction['username']}\n"
+                    f"🆔 User ID: `{transaction['user_id']}`\n"
+                    f"📦 Package: {package['plan_name']}\n"
+                    f"💰 Amount: ₹{package['amount']}\n"
+                    f"📅 Submitted: {transaction['created_at']}"
+                ),
+                parse_mode='Markdown',
+                reply_markup=reply_markup
+            )
+    
+    results = await asyncio.gather(*(send_review(transaction) for transaction in pending), return_exceptions=True)
+    
+    for transaction, result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to send pending review {transaction['id']}: {result}")
 
+@require_admin()
 async def admin_approve_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Approve screenshot - FIXED VERSION"""
     query = update.callback_query
     await query.answer()
     
-    if not is_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return
+    # Callback data: approve_TRANSACTION_ID (digits guaranteed by the handler pattern)
+    transaction_id = int(context.matches[0].group('transaction_id'))
     
-    # Parse callback data: approve_TRANSACTION_ID
-    try:
-        transaction_id = int(query.data.split('_')[1])
-    except:
-        await query.message.reply_text("❌ Invalid transaction ID!")
+    # Find the transaction
+    result = await run_query(
+        _sb().table('pending_transactions').select('id, user_id, username, package_id, status').eq('id', transaction_id).maybe_single()
+    )
+    
+    if result is None:
+        await query.message.reply_text("❌ Transaction no longer exists!")
         return
     
-    # Find the pending transaction
-    pending = supabase.table('pending_transactions').select('*').eq('id', transaction_id).eq('status', 'pending').execute().data
+    transaction = result.data
     
-    if not pending:
+    if transaction['status'] != 'pending':
         await query.answer("❌ Already processed!", show_alert=True)
         await query.message.edit_caption(
             caption=query.message.caption + "\n\n⚠️ *ALREADY PROCESSED*",
@@ -315,45 +534,54 @@ async def admin_approve_screenshot(update: Update, context: ContextTypes.DEFAULT
         )
         return
     
-    transaction = pending[0]
     user_id = transaction['user_id']
     package_id = transaction['package_id']
-    package = supabase.table('packages').select('*').eq('id', package_id).execute().data[0]
-    
-    # Generate token
-    token_id = secrets.token_hex(16)
-    token_data = {
-        'token_id': token_id,
-        'user_id': user_id,
-        'username': transaction['username'],
-        'package_id': package_id,
-        'transaction_id': f"SS_{transaction['id']}",
-        'amount': package['amount'],
-        'status': 'active',
-        'created_at': datetime.utcnow().isoformat()
-    }
-    supabase.table('tokens').insert(token_data).execute()
+    package = get_package(package_id)
     
-    # Generate key immediately
+    # Generate key immediately - no intermediate token is needed for screenshot approvals
     key = secrets.token_urlsafe(32)
     key_data = {
         'key': key,
         'user_id': user_id,
         'package_id': package_id,
-        'token_id': token_id,
+        'source_transaction_id': f"SS_{transaction['id']}",
         'validity_days': package['validity'],
-        'status': 'active',
-        'created_at': datetime.utcnow().isoformat()
+        'status': 'active'
     }
-    supabase.table('keys').insert(key_data).execute()
-    supabase.table('tokens').update({'status': 'used'}).eq('token_id', token_id).execute()
     
-    # Mark as approved
-    supabase.table('pending_transactions').update({
-        'status': 'approved',
-        'reviewed_at': datetime.utcnow().isoformat(),
-        'reviewed_by': update.effective_user.id
-    }).eq('id', transaction['id']).execute()
+    # Save key and claim the transaction concurrently. The claim only matches while the
+    # row is still pending, so if two admins approve at once exactly one of them wins.
+    saved, claimed = await asyncio.gather(
+        run_query(_sb().table('keys').insert(key_data)),
+        run_query(_sb().table('pending_transactions').update({
+            'status': 'approved',
+            'reviewed_at': _now_iso(),
+            'reviewed_by': update.effective_user.id
+        }).eq('id', transaction['id']).eq('status', 'pending')),
+        return_exceptions=True
+    )
+    _STATS_CACHE.clear()
+    
+    won = not isinstance(claimed, Exception) and bool(claimed.data)
+    if isinstance(saved, Exception) or not won:
+        # Undo whichever half landed, so there is never an approval without a key or a stray key
+        if won:
+            await run_query(_sb().table('pending_transactions').update({
+                'status': 'pending',
+                'reviewed_at': None,
+                'reviewed_by': None
+            }).eq('id', transaction['id']))
+        await run_query(_sb().table('keys').delete().eq('key', key))
+        
+        if isinstance(saved, Exception) or isinstance(claimed, Exception):
+            await query.message.reply_text("❌ Error approving transaction, please try again!")
+        else:
+            await query.answer("❌ Already processed!", show_alert=True)
+            await query.message.edit_caption(
+                caption=query.message.caption + "\n\n⚠️ *ALREADY PROCESSED*",
+                parse_mode='Markdown'
+            )
+        return
     
     # Notify user
     try:
@@ -379,26 +607,27 @@ async def admin_approve_screenshot(update: Update, context: ContextTypes.DEFAULT
     
     await query.answer("✅ Approved successfully!", show_alert=True)
 
+@require_admin()
 async def admin_reject_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Reject screenshot - FIXED VERSION"""
     query = update.callback_query
     await query.answer()
     
-    if not is_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return
+    # Callback data: reject_TRANSACTION_ID (digits guaranteed by the handler pattern)
+    transaction_id = int(context.matches[0].group('transaction_id'))
     
-    # Parse callback data: reject_TRANSACTION_ID
-    try:
-        transaction_id = int(query.data.split('_')[1])
-    except:
-        await query.message.reply_text("❌ Invalid transaction ID!")
+    # Find the transaction
+    result = await run_query(
+        _sb().table('pending_transactions').select('id, user_id, status').eq('id', transaction_id).maybe_single()
+    )
+    
+    if result is None:
+        await query.message.reply_text("❌ Transaction no longer exists!")
         return
     
-    # Find the pending transaction
-    pending = supabase.table('pending_transactions').select('*').eq('id', transaction_id).eq('status', 'pending').execute().data
+    transaction = result.data
     
-    if not pending:
+    if transaction['status'] != 'pending':
         await query.answer("❌ Already processed!", show_alert=True)
         await query.message.edit_caption(
             caption=query.message.caption + "\n\n⚠️ *ALREADY PROCESSED*",
@@ -406,15 +635,15 @@ async def admin_reject_screenshot(update: Update, context: ContextTypes.DEFAULT_
         )
         return
     
-    transaction = pending[0]
     user_id = transaction['user_id']
     
     # Mark as rejected
-    supabase.table('pending_transactions').update({
+    await run_query(_sb().table('pending_transactions').update({
         'status': 'rejected',
-        'reviewed_at': datetime.utcnow().isoformat(),
+        'reviewed_at': _now_iso(),
         'reviewed_by': update.effective_user.id
-    }).eq('id', transaction['id']).execute()
+    }).eq('id', transaction['id']))
+    _STATS_CACHE.clear()
     
     # Notify user
     try:
@@ -439,37 +668,28 @@ async def admin_reject_screenshot(update: Update, context: ContextTypes.DEFAULT_
     await query.answer("❌ Rejected!", show_alert=True)
 
 # === PACKAGE MANAGEMENT (SUPER ADMIN ONLY) ===
+@require_admin(super_only=True)
 async def admin_packages_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Packages management menu"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized! Super admin access only.")
-        return
-    
-    keyboard = [
-        [InlineKeyboardButton("➕ Add Package", callback_data="admin_add_package")],
-        [InlineKeyboardButton("📋 View Packages", callback_data="admin_view_packages")],
-        [InlineKeyboardButton("« Back", callback_data="admin_back")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(
+    await query.edit_message_text(
         "📦 *Package Management*\n\nSelect an option:",
         parse_mode='Markdown',
-        reply_markup=reply_markup
+        reply_markup=_PACKAGES_MENU_MARKUP
     )
 
+@require_admin(super_only=True)
 async def admin_view_packages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View all packages"""
     query = update.callback_query
     await query.answer()
     
-    packages = supabase.table('packages').select('*').execute().data
+    packages = get_packages(active_only=False)
     
     if not packages:
-        await query.message.reply_text("No packages found!")
+        await query.edit_message_text("No packages found!", reply_markup=_BACK_TO_PACKAGES_MARKUP)
         return
     
     text = "📦 *All Packages:*\n\n"
@@ -481,20 +701,14 @@ async def admin_view_packages(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"📝 {pkg['description']}\n\n"
         )
     
-    keyboard = [[InlineKeyboardButton("« Back", callback_data="admin_packages")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=_BACK_TO_PACKAGES_MARKUP)
 
+@require_admin(super_only=True)
 async def admin_add_package_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start adding package"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "➕ *Add New Package*\n\nEnter package name:",
         parse_mode='Markdown'
@@ -538,11 +752,11 @@ async def admin_add_package_validity(update: Update, context: ContextTypes.DEFAU
             'description': context.user_data['pkg_desc'],
             'amount': context.user_data['pkg_amount'],
             'validity': validity,
-            'is_active': True,
-            'created_at': datetime.utcnow().isoformat()
+            'is_active': True
         }
         
-        result = supabase.table('packages').insert(data).execute()
+        result = _sb().table('packages').insert(data).execute()
+        _PACKAGES_CACHE.clear()
         
         if result.data:
             await update.message.reply_text(
@@ -561,37 +775,28 @@ async def admin_add_package_validity(update: Update, context: ContextTypes.DEFAU
         return ADMIN_ADD_PKG_VALIDITY
 
 # === UPI MANAGEMENT (SUPER ADMIN ONLY) ===
+@require_admin(super_only=True)
 async def admin_upi_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """UPI management menu"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized! Super admin access only.")
-        return
-    
-    keyboard = [
-        [InlineKeyboardButton("➕ Add UPI", callback_data="admin_add_upi")],
-        [InlineKeyboardButton("📋 View UPI", callback_data="admin_view_upi")],
-        [InlineKeyboardButton("« Back", callback_data="admin_back")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(
+    await query.edit_message_text(
         "💳 *UPI Management*\n\nSelect an option:",
         parse_mode='Markdown',
-        reply_markup=reply_markup
+        reply_markup=_UPI_MENU_MARKUP
     )
 
+@require_admin(super_only=True)
 async def admin_view_upi(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View UPI details"""
     query = update.callback_query
     await query.answer()
     
-    upis = supabase.table('upi_config').select('*').execute().data
+    upis = _sb().table('upi_config').select('*').execute().data
     
     if not upis:
-        await query.message.reply_text("No UPI configured!")
+        await query.edit_message_text("No UPI configured!", reply_markup=_BACK_TO_UPI_MARKUP)
         return
     
     text = "💳 *UPI Details:*\n\n"
@@ -603,20 +808,14 @@ async def admin_view_upi(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"👤 Name: {upi['name']}\n\n"
         )
     
-    keyboard = [[InlineKeyboardButton("« Back", callback_data="admin_upi")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=_BACK_TO_UPI_MARKUP)
 
+@require_admin(super_only=True)
 async def admin_add_upi_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start adding UPI"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "➕ *Add UPI Details*\n\nEnter UPI ID:",
         parse_mode='Markdown'
@@ -635,19 +834,16 @@ async def admin_add_upi_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Receive UPI name and save"""
     upi_name = update.message.text.strip()
     
-    # Deactivate all existing UPI
-    supabase.table('upi_config').update({'is_active': False}).neq('id', 0).execute()
-    
     data = {
         'upi_id': context.user_data['upi_id'],
-        'name': upi_name,
-        'is_active': True,
-        'created_at': datetime.utcnow().isoformat()
+        'name': upi_name
     }
     
-    result = supabase.table('upi_config').insert(data).execute()
+    # Deactivate all existing UPI and insert the new one atomically
+    result = _sb().rpc('create_upi_rows', {'p_upi_id': data['upi_id'], 'p_name': data['name']}).execute()
     
     if result.data:
+        config_changed('upi_config')
         await update.message.reply_text(
             f"✅ *UPI Added Successfully!*\n\n"
             f"🆔 UPI ID: `{data['upi_id']}`\n"
@@ -660,37 +856,28 @@ async def admin_add_upi_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 # === ADMIN MANAGEMENT (SUPER ADMIN ONLY) ===
+@require_admin(super_only=True)
 async def admin_admins_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Admins management menu"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized! Super admin access only.")
-        return
-    
-    keyboard = [
-        [InlineKeyboardButton("➕ Add Admin", callback_data="admin_add_admin")],
-        [InlineKeyboardButton("📋 View Admins", callback_data="admin_view_admins")],
-        [InlineKeyboardButton("« Back", callback_data="admin_back")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(
+    await query.edit_message_text(
         "👥 *Admin Management*\n\nSelect an option:",
         parse_mode='Markdown',
-        reply_markup=reply_markup
+        reply_markup=_ADMINS_MENU_MARKUP
     )
 
+@require_admin(super_only=True)
 async def admin_view_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View all admins"""
     query = update.callback_query
     await query.answer()
     
-    admins = supabase.table('admins').select('*').execute().data
+    admins = _sb().table('admins').select('*').execute().data
     
     if not admins:
-        await query.message.reply_text("No admins found!")
+        await query.edit_message_text("No admins found!", reply_markup=_BACK_TO_ADMINS_MARKUP)
         return
     
     text = "👥 *All Admins:*\n\n"
@@ -699,20 +886,14 @@ async def admin_view_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
         role = admin.get('role', 'limited').upper()
         text += f"{status} ID: `{admin['telegram_id']}` | Role: {role}\n"
     
-    keyboard = [[InlineKeyboardButton("« Back", callback_data="admin_admins")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=_BACK_TO_ADMINS_MARKUP)
 
+@require_admin(super_only=True)
 async def admin_add_admin_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start adding admin"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "➕ *Add New Admin*\n\nEnter Telegram User ID:",
         parse_mode='Markdown'
@@ -750,17 +931,18 @@ async def admin_add_admin_role(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    role = query.data.split('_')[1]  # 'super' or 'limited'
+    role = context.matches[0].group('role')
     admin_id = context.user_data.get('new_admin_id')
     
     data = {
         'telegram_id': admin_id,
         'role': role,
-        'is_active': True,
-        'created_at': datetime.utcnow().isoformat()
+        'is_active': True
     }
     
-    result = supabase.table('admins').insert(data).execute()
+    result = _sb().table('admins').insert(data).execute()
+    _ADMIN_CACHE.pop(admin_id, None)
+    config_changed('admins')
     
     if result.data:
         role_name = "Super Admin" if role == 'super' else "Limited Admin"
@@ -776,61 +958,44 @@ async def admin_add_admin_role(update: Update, context: ContextTypes.DEFAULT_TYP
     return ConversationHandler.END
 
 # === BOT SETTINGS (SUPER ADMIN ONLY) ===
+@require_admin(super_only=True)
 async def admin_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot settings menu"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized! Super admin access only.")
-        return
-    
-    keyboard = [
-        [InlineKeyboardButton("📢 Edit Force Channel", callback_data="admin_edit_channel")],
-        [InlineKeyboardButton("🔑 Edit API Token", callback_data="admin_edit_api")],
-        [InlineKeyboardButton("📋 View Settings", callback_data="admin_view_settings")],
-        [InlineKeyboardButton("« Back", callback_data="admin_back")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(
+    await query.edit_message_text(
         "⚙️ *Bot Settings*\n\nSelect an option:",
         parse_mode='Markdown',
-        reply_markup=reply_markup
+        reply_markup=_SETTINGS_MENU_MARKUP
     )
 
+@require_admin(super_only=True)
 async def admin_view_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View current settings"""
     query = update.callback_query
     await query.answer()
     
-    settings = supabase.table('bot_settings').select('*').limit(1).execute().data
+    setting = await get_settings()
     
-    if not settings:
-        await query.message.reply_text("No settings found!")
+    if not setting:
+        await query.edit_message_text("No settings found!", reply_markup=_BACK_TO_SETTINGS_MARKUP)
         return
     
-    setting = settings[0]
     text = (
-        "⚙️ *Current Settings:*\n\n"
-        f"📢 Force Channel: {setting.get('force_channel', 'Not set')}\n"
-        f"🔑 API Token: `{setting.get('api_token', 'Not set')}`"
+        "⚙️ <b>Current Settings:</b>\n\n"
+        f"📢 Force Channel: {html.escape(str(setting.get('force_channel', 'Not set')))}\n"
+        f"🔑 API Token: <code>{html.escape(str(setting.get('api_token', 'Not set')))}</code>"
     )
     
-    keyboard = [[InlineKeyboardButton("« Back", callback_data="admin_settings")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=_BACK_TO_SETTINGS_MARKUP)
 
+@require_admin(super_only=True)
 async def admin_edit_channel_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start editing channel"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "📢 *Edit Force Channel*\n\n"
         "Enter channel username (with @) or channel ID:",
@@ -849,12 +1014,7 @@ async def admin_edit_channel_save(update: Update, context: ContextTypes.DEFAULT_
     elif not channel.startswith('@'):
         channel = '@' + channel
     
-    settings = supabase.table('bot_settings').select('*').limit(1).execute().data
-    
-    if settings:
-        supabase.table('bot_settings').update({'force_channel': channel}).eq('id', settings[0]['id']).execute()
-    else:
-        supabase.table('bot_settings').insert({'force_channel': channel}).execute()
+    await save_setting('force_channel', channel)
     
     channel_type = "Channel ID" if channel.startswith('-') else "Channel Username"
     
@@ -868,15 +1028,12 @@ async def admin_edit_channel_save(update: Update, context: ContextTypes.DEFAULT_
     
     return ConversationHandler.END
 
+@require_admin(super_only=True)
 async def admin_edit_api_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start editing API token"""
     query = update.callback_query
     await query.answer()
     
-    if not is_super_admin(update.effective_user.id):
-        await query.message.reply_text("❌ Unauthorized!")
-        return ConversationHandler.END
-    
     await query.message.reply_text(
         "🔑 *Edit API Token*\n\n"
         "Enter new API token:",
@@ -889,85 +1046,40 @@ async def admin_edit_api_save(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Save API token"""
     api_token = update.message.text.strip()
     
-    settings = supabase.table('bot_settings').select('*').limit(1).execute().data
-    
-    if settings:
-        supabase.table('bot_settings').update({'api_token': api_token}).eq('id', settings[0]['id']).execute()
-    else:
-        supabase.table('bot_settings').insert({'api_token': api_token}).execute()
-    
     await update.message.reply_text(
-        f"✅ *API Token Updated!*\n\n🔑 Token: `{api_token}`",
-        parse_mode='Markdown'
+        f"✅ <b>API Token Updated!</b>\n\n🔑 Token: <code>{html.escape(api_token)}</code>",
+        parse_mode=ParseMode.HTML
     )
     
+    # Persist after replying so the admin doesn't wait on the database write
+    context.application.create_task(persist_setting('api_token', api_token), update=update)
+    
     return ConversationHandler.END
 
 # === STATISTICS ===
+@require_admin()
 async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show statistics"""
     query = update.callback_query
     await query.answer()
     
-    total_users = supabase.table('users').select('*', count='exact').execute().count
-    total_tokens = supabase.table('tokens').select('*', count='exact').execute().count
-    active_tokens = supabase.table('tokens').select('*', count='exact').eq('status', 'active').execute().count
-    total_keys = supabase.table('keys').select('*', count='exact').execute().count
-    pending_reviews = supabase.table('pending_transactions').select('*', count='exact').eq('status', 'pending').execute().count
+    stats = await get_stats()
     
-    text = (
-        f"📊 *Statistics*\n\n"
-        f"👥 Total Users: {total_users}\n"
-        f"🎟 Total Tokens: {total_tokens}\n"
-        f"✅ Active Tokens: {active_tokens}\n"
-        f"🔑 Total Keys: {total_keys}\n"
-        f"⏳ Pending Reviews: {pending_reviews}"
+    await query.edit_message_text(
+        _STATS_TEMPLATE.format_map(stats),
+        parse_mode=ParseMode.HTML,
+        reply_markup=_BACK_TO_PANEL_MARKUP
     )
-    
-    keyboard = [[InlineKeyboardButton("« Back", callback_data="admin_back")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
 
 # === HELPER FUNCTIONS ===
+@require_admin()
 async def admin_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Back to main admin panel"""
     query = update.callback_query
     await query.answer()
     
-    user_id = update.effective_user.id
-    role = get_admin_role(user_id)
-    
-    if role == 'limited':
-        keyboard = [
-            [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
-            [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
-            [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.edit_text(
-            "🔓 *Limited Admin Panel*\n\nSelect an option:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    else:
-        keyboard = [
-            [InlineKeyboardButton("➕ Generate Token Manually", callback_data="admin_gen_token")],
-            [InlineKeyboardButton("📋 View Pending Reviews", callback_data="admin_pending")],
-            [InlineKeyboardButton("📦 Manage Packages", callback_data="admin_packages")],
-            [InlineKeyboardButton("💳 Manage UPI", callback_data="admin_upi")],
-            [InlineKeyboardButton("👥 Manage Admins", callback_data="admin_admins")],
-            [InlineKeyboardButton("⚙️ Bot Settings", callback_data="admin_settings")],
-            [InlineKeyboardButton("📊 Statistics", callback_data="admin_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.edit_text(
-            "🔑 *Super Admin Panel*\n\nSelect an option:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+    text, reply_markup = _PANELS.get(context.user_data['_admin_role'], _PANELS['super'])
+    await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
 
 async def admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel operation"""
@@ -980,69 +1092,102 @@ async def admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return ConversationHandler.END
 
+async def close_http_client(application):
+    """Close the shared HTTP client on application shutdown"""
+    await _ASYNC_HTTP.aclose()
+
+# Callback query patterns, compiled once
+P_ADMIN_GEN_TOKEN = re.compile(r'^admin_gen_token$')
+P_ADMIN_PKG = re.compile(r'^admin_pkg_(?P<package_id>\d+)$')
+P_ADMIN_CANCEL = re.compile(r'^admin_cancel$')
+P_ADMIN_ADD_PACKAGE = re.compile(r'^admin_add_package$')
+P_ADMIN_ADD_UPI = re.compile(r'^admin_add_upi$')
+P_ADMIN_ADD_ADMIN = re.compile(r'^admin_add_admin$')
+P_ROLE = re.compile(r'^role_(?P<role>super|limited)$')
+P_ADMIN_EDIT_CHANNEL = re.compile(r'^admin_edit_channel$')
+P_ADMIN_EDIT_API = re.compile(r'^admin_edit_api$')
+P_ADMIN_PENDING = re.compile(r'^admin_pending$')
+P_ADMIN_PACKAGES = re.compile(r'^admin_packages$')
+P_ADMIN_VIEW_PACKAGES = re.compile(r'^admin_view_packages$')
+P_ADMIN_UPI = re.compile(r'^admin_upi$')
+P_ADMIN_VIEW_UPI = re.compile(r'^admin_view_upi$')
+P_ADMIN_ADMINS = re.compile(r'^admin_admins$')
+P_ADMIN_VIEW_ADMINS = re.compile(r'^admin_view_admins$')
+P_ADMIN_SETTINGS = re.compile(r'^admin_settings$')
+P_ADMIN_VIEW_SETTINGS = re.compile(r'^admin_view_settings$')
+P_ADMIN_STATS = re.compile(r'^admin_stats$')
+P_APPROVE = re.compile(r'^approve_(?P<transaction_id>\d+)$')
+P_REJECT = re.compile(r'^reject_(?P<transaction_id>\d+)$')
+P_ADMIN_BACK = re.compile(r'^admin_back$')
+
+# Shared across all admin conversations
+TEXT_NOCMD = filters.TEXT & ~filters.COMMAND
+CANCEL_CB = CallbackQueryHandler(admin_cancel, pattern=P_ADMIN_CANCEL)
+
 # Export handlers
+@functools.lru_cache(maxsize=1)
 def get_admin_handlers():
-    """Return all admin handlers"""
+    """Return all admin handlers (built once and reused)"""
     
     # Manual token generation
     token_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_generate_token_callback, pattern="^admin_gen_token$")],
+        entry_points=[CallbackQueryHandler(admin_generate_token_callback, pattern=P_ADMIN_GEN_TOKEN)],
         states={
-            ADMIN_WAITING_USERNAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_receive_username)],
-            ADMIN_WAITING_PACKAGE: [CallbackQueryHandler(admin_select_package, pattern="^admin_pkg_")],
-            ADMIN_WAITING_TXN: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_receive_transaction)]
+            ADMIN_WAITING_USERNAME: [MessageHandler(TEXT_NOCMD, admin_receive_username)],
+            ADMIN_WAITING_PACKAGE: [CallbackQueryHandler(admin_select_package, pattern=P_ADMIN_PKG)],
+            ADMIN_WAITING_TXN: [MessageHandler(TEXT_NOCMD, admin_receive_transaction)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     # Add package
     pkg_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_add_package_start, pattern="^admin_add_package$")],
+        entry_points=[CallbackQueryHandler(admin_add_package_start, pattern=P_ADMIN_ADD_PACKAGE)],
         states={
-            ADMIN_ADD_PKG_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_package_name)],
-            ADMIN_ADD_PKG_DESC: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_package_desc)],
-            ADMIN_ADD_PKG_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_package_amount)],
-            ADMIN_ADD_PKG_VALIDITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_package_validity)]
+            ADMIN_ADD_PKG_NAME: [MessageHandler(TEXT_NOCMD, admin_add_package_name)],
+            ADMIN_ADD_PKG_DESC: [MessageHandler(TEXT_NOCMD, admin_add_package_desc)],
+            ADMIN_ADD_PKG_AMOUNT: [MessageHandler(TEXT_NOCMD, admin_add_package_amount)],
+            ADMIN_ADD_PKG_VALIDITY: [MessageHandler(TEXT_NOCMD, admin_add_package_validity)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     # Add UPI
     upi_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_add_upi_start, pattern="^admin_add_upi$")],
+        entry_points=[CallbackQueryHandler(admin_add_upi_start, pattern=P_ADMIN_ADD_UPI)],
         states={
-            ADMIN_ADD_UPI_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_upi_id)],
-            ADMIN_ADD_UPI_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_upi_name)]
+            ADMIN_ADD_UPI_ID: [MessageHandler(TEXT_NOCMD, admin_add_upi_id)],
+            ADMIN_ADD_UPI_NAME: [MessageHandler(TEXT_NOCMD, admin_add_upi_name)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     # Add Admin
     admin_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_add_admin_start, pattern="^admin_add_admin$")],
+        entry_points=[CallbackQueryHandler(admin_add_admin_start, pattern=P_ADMIN_ADD_ADMIN)],
         states={
-            ADMIN_ADD_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_admin_id)],
-            ADMIN_ADD_ADMIN_ROLE: [CallbackQueryHandler(admin_add_admin_role, pattern="^role_")]
+            ADMIN_ADD_ADMIN_ID: [MessageHandler(TEXT_NOCMD, admin_add_admin_id)],
+            ADMIN_ADD_ADMIN_ROLE: [CallbackQueryHandler(admin_add_admin_role, pattern=P_ROLE)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     # Edit Channel
     channel_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_edit_channel_start, pattern="^admin_edit_channel$")],
+        entry_points=[CallbackQueryHandler(admin_edit_channel_start, pattern=P_ADMIN_EDIT_CHANNEL)],
         states={
-            ADMIN_EDIT_CHANNEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_edit_channel_save)]
+            ADMIN_EDIT_CHANNEL: [MessageHandler(TEXT_NOCMD, admin_edit_channel_save)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     # Edit API
     api_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(admin_edit_api_start, pattern="^admin_edit_api$")],
+        entry_points=[CallbackQueryHandler(admin_edit_api_start, pattern=P_ADMIN_EDIT_API)],
         states={
-            ADMIN_EDIT_API: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_edit_api_save)]
+            ADMIN_EDIT_API: [MessageHandler(TEXT_NOCMD, admin_edit_api_save)]
         },
-        fallbacks=[CallbackQueryHandler(admin_cancel, pattern="^admin_cancel$")]
+        fallbacks=[CANCEL_CB]
     )
     
     return [
@@ -1053,17 +1198,17 @@ def get_admin_handlers():
         admin_conv,
         channel_conv,
         api_conv,
-        CallbackQueryHandler(admin_view_pending, pattern="^admin_pending$"),
-        CallbackQueryHandler(admin_packages_menu, pattern="^admin_packages$"),
-        CallbackQueryHandler(admin_view_packages, pattern="^admin_view_packages$"),
-        CallbackQueryHandler(admin_upi_menu, pattern="^admin_upi$"),
-        CallbackQueryHandler(admin_view_upi, pattern="^admin_view_upi$"),
-        CallbackQueryHandler(admin_admins_menu, pattern="^admin_admins$"),
-        CallbackQueryHandler(admin_view_admins, pattern="^admin_view_admins$"),
-        CallbackQueryHandler(admin_settings_menu, pattern="^admin_settings$"),
-        CallbackQueryHandler(admin_view_settings, pattern="^admin_view_settings$"),
-        CallbackQueryHandler(admin_stats, pattern="^admin_stats$"),
-        CallbackQueryHandler(admin_approve_screenshot, pattern="^approve_"),
-        CallbackQueryHandler(admin_reject_screenshot, pattern="^reject_"),
-        CallbackQueryHandler(admin_back, pattern="^admin_back$")
+        CallbackQueryHandler(admin_view_pending, pattern=P_ADMIN_PENDING),
+        CallbackQueryHandler(admin_packages_menu, pattern=P_ADMIN_PACKAGES),
+        CallbackQueryHandler(admin_view_packages, pattern=P_ADMIN_VIEW_PACKAGES),
+        CallbackQueryHandler(admin_upi_menu, pattern=P_ADMIN_UPI),
+        CallbackQueryHandler(admin_view_upi, pattern=P_ADMIN_VIEW_UPI),
+        CallbackQueryHandler(admin_admins_menu, pattern=P_ADMIN_ADMINS),
+        CallbackQueryHandler(admin_view_admins, pattern=P_ADMIN_VIEW_ADMINS),
+        CallbackQueryHandler(admin_settings_menu, pattern=P_ADMIN_SETTINGS),
+        CallbackQueryHandler(admin_view_settings, pattern=P_ADMIN_VIEW_SETTINGS),
+        CallbackQueryHandler(admin_stats, pattern=P_ADMIN_STATS),
+        CallbackQueryHandler(admin_approve_screenshot, pattern=P_APPROVE),
+        CallbackQueryHandler(admin_reject_screenshot, pattern=P_REJECT),
+        CallbackQueryHandler(admin_back, pattern=P_ADMIN_BACK)
     ]
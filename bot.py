@@ -1,16 +1,20 @@
 import os
-import qrcode
+import re
+import segno
 import io
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, filters, ContextTypes, ConversationHandler
+    MessageHandler, filters, ContextTypes, ConversationHandler, AIORateLimiter
 )
-from supabase import create_client, Client
-import requests
+from telegram.request import HTTPXRequest
+from supabase import create_client, Client, ClientOptions
+from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+import httpx
 import logging
+import asyncio
 from datetime import datetime
-import secrets
+from cachetools import TTLCache, LRUCache
 
 # Logging setup
 logging.basicConfig(
@@ -21,154 +25,217 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # e.g. https://your-app.up.railway.app - enables webhook mode
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Telegram echoes it in X-Telegram-Bot-Api-Secret-Token; other requests are rejected
+PORT = int(os.getenv('PORT', '8443'))
+# Telegram connection pools: outgoing API calls vs. getUpdates long-polling
+TG_POOL_SIZE = int(os.getenv('TG_POOL_SIZE', '32'))
+TG_UPDATES_POOL_SIZE = int(os.getenv('TG_UPDATES_POOL_SIZE', '4'))
+TG_POOL_TIMEOUT = float(os.getenv('TG_POOL_TIMEOUT', '20'))
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-# Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Supabase client - one shared instance so its HTTP/2 connection is reused across queries
+supabase: Client = create_client(
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    options=ClientOptions(postgrest_client_timeout=httpx.Timeout(10.0, connect=5.0))
+)
+
+# Admin list is read on every notification fan-out but rarely changes
+_ADMINS_CACHE = TTLCache(maxsize=1, ttl=60)
+
+# Settings and UPI details are effectively static config
+_SETTINGS_CACHE = TTLCache(maxsize=1, ttl=300)
+_UPI_CACHE = TTLCache(maxsize=1, ttl=300)
+
+# Packages by id, shared by the purchase flow and key generation
+_PACKAGE_CACHE = TTLCache(maxsize=128, ttl=60)
+
+# Rendered QR PNGs keyed by UPI string - the same (UPI, amount) always encodes to the same image
+_QR_CACHE = LRUCache(maxsize=64)
+
+# Shared async HTTP client for payment verification - keeps connections alive and never blocks the event loop
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30)
+)
 
 # Conversation states
 WAITING_TOKEN, WAITING_PAYMENT_PROOF = range(2)
 
+# Callback data patterns, compiled once
+P_SELECT_PKG = re.compile(r'^select_pkg_(?P<package_id>\d+)$')
+
+# Static message texts (Markdown)
+_MAIN_MENU_TEXT = (
+    "🎯 *Welcome to Key Generator Bot!*\n\n"
+    "What would you like to do?\n\n"
+    "• *Generate Key* - Generate key using token\n"
+    "• *Buy Package* - Purchase new package"
+)
+
+_NEW_USER_TEMPLATE = (
+    "🆕 *New User Started Bot*\n\n"
+    "👤 Name: {first_name}\n"
+    "🆔 User ID: `{user_id}`\n"
+    "📱 Username: @{username}\n"
+    "🕐 Time: {time}"
+)
+
+_PACKAGE_CAPTION_TEMPLATE = (
+    "📦 *{plan_name}*\n\n"
+    "💰 Amount: ₹{amount}\n"
+    "⏱ Validity: {validity} days\n"
+    "📝 Description: {description}\n\n"
+    "💳 UPI ID: `{upi_id}`\n"
+    "👤 Name: {upi_name}\n\n"
+    "📱 *Payment Steps:*\n"
+    "1️⃣ Scan the QR code above\n"
+    "2️⃣ Or copy UPI ID and pay manually\n"
+    "3️⃣ Complete payment in your UPI app\n\n"
+    "💡 *After Payment:*\n"
+    "📤 Send Transaction ID/UTR (instant verification)\n"
+    "📸 Or send payment screenshot (manual review)\n\n"
+    "👇 Waiting for your payment proof..."
+)
+
+_SCREENSHOT_REVIEW_TEMPLATE = (
+    "📸 *New Payment Screenshot*\n\n"
+    "👤 User: @{username}\n"
+    "🆔 User ID: `{user_id}`\n"
+    "📦 Package: {plan_name}\n"
+    "💰 Amount: ₹{amount}\n"
+    "⏱ Validity: {validity} days"
+)
+
+# Static keyboards, built once at import
+_MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔑 Generate Key", callback_data="generate_key")],
+    [InlineKeyboardButton("💳 Buy Package", callback_data="buy_package")]
+])
+
+_BACK_TO_PACKAGES_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back", callback_data="buy_package")]])
+
 # Helper functions
-def get_bot_settings():
-    """Get bot settings from database"""
-    result = supabase.table('bot_settings').select('*').limit(1).execute()
-    if result.data:
-        return result.data[0]
-    return None
-
-def get_all_admins():
-    """Get all admin IDs"""
-    result = supabase.table('admins').select('telegram_id').eq('is_active', True).execute()
-    return [admin['telegram_id'] for admin in result.data] if result.data else []
-
-def is_admin(user_id):
-    """Check if user is admin"""
-    return user_id in get_all_admins()
-
-def get_upi_details():
-    """Get active UPI details"""
-    result = supabase.table('upi_config').select('*').eq('is_active', True).limit(1).execute()
-    if result.data:
-        return result.data[0]
-    return None
-
-def get_all_packages():
+async def run_query(query):
+    """Execute a Supabase query in a worker thread so the event loop isn't blocked"""
+    return await asyncio.to_thread(query.execute)
+
+async def get_bot_settings():
+    """Get bot settings from database (cached)"""
+    settings = _SETTINGS_CACHE.get('settings')
+    if settings is None:
+        result = await run_query(supabase.table('bot_settings').select('force_channel, api_token').limit(1))
+        settings = result.data[0] if result.data else {}
+        _SETTINGS_CACHE['settings'] = settings
+    return settings or None
+
+async def get_all_admins():
+    """Get all admin IDs as a frozenset (cached)"""
+    admins = _ADMINS_CACHE.get('admins')
+    if admins is None:
+        result = await run_query(supabase.table('admins').select('telegram_id').eq('is_active', True))
+        admins = frozenset(admin['telegram_id'] for admin in result.data) if result.data else frozenset()
+        _ADMINS_CACHE['admins'] = admins
+    return admins
+
+def invalidate_admins_cache():
+    """Drop the cached admin list so the next lookup refetches it"""
+    _ADMINS_CACHE.clear()
+
+async def get_upi_details():
+    """Get active UPI details (cached)"""
+    upi_details = _UPI_CACHE.get('upi')
+    if upi_details is None:
+        result = await run_query(supabase.table('upi_config').select('upi_id, name').eq('is_active', True).limit(1))
+        upi_details = result.data[0] if result.data else {}
+        _UPI_CACHE['upi'] = upi_details
+    return upi_details or None
+
+async def get_all_packages():
     """Get all active packages"""
-    result = supabase.table('packages').select('*').eq('is_active', True).order('amount').execute()
+    result = await run_query(supabase.table('packages').select('id, plan_name, amount, validity').eq('is_active', True).order('amount'))
     return result.data
 
-def get_package_by_id(package_id):
-    """Get specific package"""
-    result = supabase.table('packages').select('*').eq('id', package_id).execute()
-    if result.data:
-        return result.data[0]
-    return None
-
-def save_user(user_id, username, first_name, last_name=None):
-    """Save or update user in database"""
-    data = {
-        'user_id': user_id,
-        'username': username,
-        'first_name': first_name,
-        'last_name': last_name,
-        'last_interaction': datetime.utcnow().isoformat()
-    }
-    
-    # Check if user exists
-    existing = supabase.table('users').select('*').eq('user_id', user_id).execute()
-    
-    if existing.data:
-        supabase.table('users').update(data).eq('user_id', user_id).execute()
-    else:
-        supabase.table('users').insert(data).execute()
+async def get_package_by_id(package_id):
+    """Get specific package (cached)"""
+    package = _PACKAGE_CACHE.get(package_id)
+    if package is None:
+        result = await run_query(supabase.table('packages').select('id, plan_name, description, amount, validity').eq('id', package_id))
+        package = result.data[0] if result.data else {}
+        _PACKAGE_CACHE[package_id] = package
+    return package or None
+
+async def save_user(user_id, username, first_name, last_name=None):
+    """Save or update user in database - returns True if the user is new"""
+    result = await run_query(supabase.rpc('upsert_user', {
+        'p_user_id': user_id,
+        'p_username': username,
+        'p_first_name': first_name,
+        'p_last_name': last_name
+    }))
+    return result.data is True
 
 async def notify_admins_new_user(context, user_id, username, first_name):
     """Notify all admins about new user"""
-    admins = get_all_admins()
-    message = (
-        f"🆕 *New User Started Bot*\n\n"
-        f"👤 Name: {first_name}\n"
-        f"🆔 User ID: `{user_id}`\n"
-        f"📱 Username: @{username if username else 'N/A'}\n"
-        f"🕐 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    )
-    
-    for admin_id in admins:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            logger.error(f"Failed to notify admin {admin_id}: {e}")
-
-def generate_token_id():
-    """Generate unique token ID"""
-    return secrets.token_hex(16)
-
-def save_token(user_id, username, package_id, transaction_id, amount):
-    """Save token to database"""
-    token_id = generate_token_id()
-    data = {
-        'token_id': token_id,
+    admins = await get_all_admins()
+    message = _NEW_USER_TEMPLATE.format_map({
+        'first_name': first_name,
         'user_id': user_id,
-        'username': username,
-        'package_id': package_id,
-        'transaction_id': transaction_id,
-        'amount': amount,
-        'status': 'active',
-        'created_at': datetime.utcnow().isoformat()
-    }
-    result = supabase.table('tokens').insert(data).execute()
-    return token_id if result.data else None
-
-def generate_key(token_id, user_id):
-    """Generate key from token"""
-    result = supabase.table('tokens').select('*').eq('token_id', token_id).eq('user_id', user_id).eq('status', 'active').execute()
-    
-    if not result.data:
-        return None
+        'username': username or 'N/A',
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
     
-    token_data = result.data[0]
-    package = get_package_by_id(token_data['package_id'])
-    
-    if not package:
-        return None
-    
-    key = secrets.token_urlsafe(32)
+    results = await asyncio.gather(
+        *(context.bot.send_message(chat_id=admin_id, text=message, parse_mode='Markdown') for admin_id in admins),
+        return_exceptions=True
+    )
     
-    key_data = {
-        'key': key,
-        'user_id': user_id,
-        'package_id': token_data['package_id'],
-        'token_id': token_id,
-        'validity_days': package['validity'],
-        'created_at': datetime.utcnow().isoformat(),
-        'status': 'active'
-    }
-    supabase.table('keys').insert(key_data).execute()
-    supabase.table('tokens').update({'status': 'used'}).eq('token_id', token_id).execute()
+    for admin_id, result in zip(admins, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify admin {admin_id}: {result}")
+
+def render_qr(data):
+    """Render a QR code as PNG bytes"""
+    qr = segno.make(data, error='m', micro=False)
     
-    return key
+    bio = io.BytesIO()
+    qr.save(bio, kind='png', scale=10, border=5)
+    return bio.getvalue()
 
-def is_transaction_used(transaction_id):
+async def generate_key(token_id, user_id):
+    """Generate key from token - insert and token update run atomically in the redeem_token RPC"""
+    result = await run_query(supabase.rpc('redeem_token', {'p_token_id': token_id, 'p_user_id': user_id}))
+    return result.data
+
+async def issue_key(user_id, username, package_id, transaction_id, amount):
+    """Record a verified purchase and issue its key in one RPC"""
+    result = await run_query(supabase.rpc('issue_key', {
+        'p_user_id': user_id,
+        'p_username': username,
+        'p_package_id': package_id,
+        'p_transaction_id': transaction_id,
+        'p_amount': amount
+    }))
+    return result.data
+
+async def is_transaction_used(transaction_id):
     """Check if transaction ID is already used - CRITICAL FIX"""
-    result = supabase.table('tokens').select('transaction_id').eq('transaction_id', transaction_id).execute()
+    result = await run_query(supabase.table('tokens').select('transaction_id').eq('transaction_id', transaction_id).limit(1))
     return len(result.data) > 0 if result.data else False
 
-def verify_transaction(transaction_id, expected_amount):
+async def verify_transaction(transaction_id, expected_amount):
     """Verify transaction via API - WITH REUSE PREVENTION"""
     # FIRST: Check if transaction ID already used
-    if is_transaction_used(transaction_id):
+    if await is_transaction_used(transaction_id):
         return {
             'status': 'FAILED',
             'message': '❌ This Transaction ID has already been used!'
         }
     
-    settings = get_bot_settings()
+    settings = await get_bot_settings()
     
     if not settings or not settings.get('api_token'):
         return {'status': 'ERROR', 'message': 'API configuration not found'}
@@ -177,10 +244,10 @@ def verify_transaction(transaction_id, expected_amount):
     url = f"https://api.intechost.com/bharatpe/api.php?token={api_token}&txn_id={transaction_id}"
     
     try:
-        response = requests.get(url, timeout=10)
+        response = await _HTTP.get(url)
         data = response.json()
         
-        if data.get('status') == 'SUCCESS' and float(data.get('amount', 0)) == float(expected_amount):
+        if data.get('status') == 'SUCCESS' and abs(float(data.get('amount', 0)) - float(expected_amount)) < 0.01:
             return {
                 'status': 'SUCCESS',
                 'amount': data.get('amount'),
@@ -197,9 +264,10 @@ def verify_transaction(transaction_id, expected_amount):
         return {'status': 'ERROR', 'message': str(e)}
 
 # Bot handlers
-async def check_channel_membership(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def check_channel_membership(update: Update, context: ContextTypes.DEFAULT_TYPE, settings=None):
     """Check if user is member of required channel"""
-    settings = get_bot_settings()
+    if settings is None:
+        settings = await get_bot_settings()
     
     if not settings or not settings.get('force_channel'):
         return True
@@ -230,16 +298,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
     user = update.effective_user
     
-    save_user(user.id, user.username, user.first_name, user.last_name)
+    is_new = await save_user(user.id, user.username, user.first_name, user.last_name)
     
-    existing = supabase.table('users').select('*').eq('user_id', user.id).execute()
-    if not existing.data or len(existing.data) == 0:
+    if is_new:
         await notify_admins_new_user(context, user.id, user.username, user.first_name)
     
-    settings = get_bot_settings()
+    settings = await get_bot_settings()
     
     if settings and settings.get('force_channel'):
-        is_member = await check_channel_membership(update, context)
+        is_member = await check_channel_membership(update, context, settings)
         
         if not is_member:
             channel = settings['force_channel']
@@ -299,23 +366,10 @@ async def verify_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show main menu"""
-    keyboard = [
-        [InlineKeyboardButton("🔑 Generate Key", callback_data="generate_key")],
-        [InlineKeyboardButton("💳 Buy Package", callback_data="buy_package")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    text = (
-        "🎯 *Welcome to Key Generator Bot!*\n\n"
-        "What would you like to do?\n\n"
-        "• *Generate Key* - Generate key using token\n"
-        "• *Buy Package* - Purchase new package"
-    )
-    
     if update.callback_query:
-        await update.callback_query.message.edit_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+        await update.callback_query.message.edit_text(_MAIN_MENU_TEXT, parse_mode='Markdown', reply_markup=_MAIN_MENU_MARKUP)
     else:
-        await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+        await update.message.reply_text(_MAIN_MENU_TEXT, parse_mode='Markdown', reply_markup=_MAIN_MENU_MARKUP)
 
 async def generate_key_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Generate key callback"""
@@ -335,7 +389,7 @@ async def receive_token(update: Update, context: ContextTypes.DEFAULT_TYPE):
     token_id = update.message.text.strip()
     user_id = update.effective_user.id
     
-    key = generate_key(token_id, user_id)
+    key = await generate_key(token_id, user_id)
     
     if key:
         await update.message.reply_text(
@@ -357,7 +411,7 @@ async def buy_package_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    packages = get_all_packages()
+    packages = await get_all_packages()
     
     if not packages:
         await query.message.reply_text("❌ No packages available at the moment.")
@@ -385,16 +439,17 @@ async def select_package_callback(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
-    package_id = int(query.data.split('_')[2])
-    package = get_package_by_id(package_id)
+    package_id = int(context.matches[0].group('package_id'))
+    package = await get_package_by_id(package_id)
     
     if not package:
         await query.message.reply_text("❌ Package not found!")
         return
     
     context.user_data['selected_package_id'] = package_id
+    context.user_data['selected_package'] = package
     
-    upi_details = get_upi_details()
+    upi_details = await get_upi_details()
     
     if not upi_details:
         await query.message.reply_text("❌ Payment method not configured!")
@@ -403,41 +458,24 @@ async def select_package_callback(update: Update, context: ContextTypes.DEFAULT_
     # Generate QR code
     upi_string = f"upi://pay?pa={upi_details['upi_id']}&pn={upi_details['name']}&am={package['amount']}&cu=INR"
     
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(upi_string)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    bio = io.BytesIO()
-    img.save(bio, 'PNG')
-    bio.seek(0)
-    
-    keyboard = [
-        [InlineKeyboardButton("« Back", callback_data="buy_package")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    png = _QR_CACHE.get(upi_string)
+    if png is None:
+        # Encoding and rasterizing is CPU-bound, keep it off the event loop
+        png = await asyncio.to_thread(render_qr, upi_string)
+        _QR_CACHE[upi_string] = png
     
     await query.message.reply_photo(
-        photo=InputFile(bio, filename='qr.png'),
-        caption=(
-            f"📦 *{package['plan_name']}*\n\n"
-            f"💰 Amount: ₹{package['amount']}\n"
-            f"⏱ Validity: {package['validity']} days\n"
-            f"📝 Description: {package['description']}\n\n"
-            f"💳 UPI ID: `{upi_details['upi_id']}`\n"
-            f"👤 Name: {upi_details['name']}\n\n"
-            f"📱 *Payment Steps:*\n"
-            f"1️⃣ Scan the QR code above\n"
-            f"2️⃣ Or copy UPI ID and pay manually\n"
-            f"3️⃣ Complete payment in your UPI app\n\n"
-            f"💡 *After Payment:*\n"
-            f"📤 Send Transaction ID/UTR (instant verification)\n"
-            f"📸 Or send payment screenshot (manual review)\n\n"
-            f"👇 Waiting for your payment proof..."
-        ),
+        photo=InputFile(png, filename='qr.png'),
+        caption=_PACKAGE_CAPTION_TEMPLATE.format_map({
+            'plan_name': package['plan_name'],
+            'amount': package['amount'],
+            'validity': package['validity'],
+            'description': package['description'],
+            'upi_id': upi_details['upi_id'],
+            'upi_name': upi_details['name']
+        }),
         parse_mode='Markdown',
-        reply_markup=reply_markup
+        reply_markup=_BACK_TO_PACKAGES_MARKUP
     )
     
     return WAITING_PAYMENT_PROOF
@@ -452,14 +490,14 @@ async def receive_payment_proof(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ Error: Package not found!")
         return ConversationHandler.END
     
-    package = get_package_by_id(package_id)
+    package = context.user_data.get('selected_package') or await get_package_by_id(package_id)
     
     # Check if user sent a photo (screenshot)
     if update.message.photo:
         await handle_screenshot_submission(update, context, user_id, username, package_id, package)
     # Check if user sent text (transaction ID)
     elif update.message.text:
-        await handle_transaction_id_submission(update, context, user_id, username, package_id, package)
+        return await handle_transaction_id_submission(update, context, user_id, username, package_id, package)
     else:
         await update.message.reply_text(
             "❌ Please send either:\n"
@@ -476,25 +514,22 @@ async def handle_transaction_id_submission(update, context, user_id, username, p
     
     await update.message.reply_text("⏳ Verifying transaction...")
     
-    result = verify_transaction(txn_id, package['amount'])
+    result = await verify_transaction(txn_id, package['amount'])
     
     if result['status'] == 'SUCCESS':
-        # Auto-generate token and key
-        token_id = save_token(user_id, username, package_id, txn_id, package['amount'])
+        # Record the token and issue the key in one round-trip
+        key = await issue_key(user_id, username, package_id, txn_id, package['amount'])
         
-        # Generate key immediately
-        key = secrets.token_urlsafe(32)
-        key_data = {
-            'key': key,
-            'user_id': user_id,
-            'package_id': package_id,
-            'token_id': token_id,
-            'validity_days': package['validity'],
-            'created_at': datetime.utcnow().isoformat(),
-            'status': 'active'
-        }
-        supabase.table('keys').insert(key_data).execute()
-        supabase.table('tokens').update({'status': 'used'}).eq('token_id', token_id).execute()
+        if not key:
+            logger.error(f"issue_key returned no key for user {user_id}, package {package_id}, txn {txn_id}")
+            await update.message.reply_text(
+                f"⚠️ *Payment Verified, but the key could not be issued!*\n\n"
+                f"Please contact an admin with your Transaction ID: `{txn_id}`\n"
+                f"📸 Or send your payment screenshot for manual review.",
+                parse_mode='Markdown'
+            )
+            # Keep the conversation open so the screenshot offered above is accepted
+            return WAITING_PAYMENT_PROOF
         
         await update.message.reply_text(
             f"✅ *Payment Verified & Approved!*\n\n"
@@ -507,6 +542,7 @@ async def handle_transaction_id_submission(update, context, user_id, username, p
             f"⚠️ Keep this key safe!",
             parse_mode='Markdown'
         )
+        return ConversationHandler.END
     else:
         await update.message.reply_text(
             f"❌ *Automatic Verification Failed!*\n\n"
@@ -514,6 +550,7 @@ async def handle_transaction_id_submission(update, context, user_id, username, p
             f"💡 You can send payment screenshot instead for manual review.",
             parse_mode='Markdown'
         )
+        return WAITING_PAYMENT_PROOF
 
 async def handle_screenshot_submission(update, context, user_id, username, package_id, package):
     """Handle manual screenshot review"""
@@ -526,10 +563,9 @@ async def handle_screenshot_submission(update, context, user_id, username, packa
         'username': username,
         'package_id': package_id,
         'screenshot_file_id': file_id,
-        'status': 'pending',
-        'created_at': datetime.utcnow().isoformat()
+        'status': 'pending'
     }
-    supabase.table('pending_transactions').insert(pending_data).execute()
+    pending_result = await run_query(supabase.table('pending_transactions').insert(pending_data))
     
     await update.message.reply_text(
         "✅ *Screenshot Received!*\n\n"
@@ -539,9 +575,7 @@ async def handle_screenshot_submission(update, context, user_id, username, packa
         parse_mode='Markdown'
     )
     
-    # Get the pending transaction ID that was just created
-    pending_result = supabase.table('pending_transactions').select('id').eq('user_id', user_id).eq('package_id', package_id).eq('status', 'pending').order('created_at', desc=True).limit(1).execute()
-    
+    # The insert returns the created row, so no need to query it back
     if not pending_result.data:
         logger.error("Failed to get pending transaction ID")
         return
@@ -549,32 +583,36 @@ async def handle_screenshot_submission(update, context, user_id, username, packa
     pending_id = pending_result.data[0]['id']
     
     # Notify all admins
-    admins = get_all_admins()
+    admins = await get_all_admins()
     
-    for admin_id in admins:
-        try:
-            keyboard = [
-                [InlineKeyboardButton("✅ Approve", callback_data=f"approve_{pending_id}")],
-                [InlineKeyboardButton("❌ Reject", callback_data=f"reject_{pending_id}")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await context.bot.send_photo(
-                chat_id=admin_id,
-                photo=file_id,
-                caption=(
-                    f"📸 *New Payment Screenshot*\n\n"
-                    f"👤 User: @{username}\n"
-                    f"🆔 User ID: `{user_id}`\n"
-                    f"📦 Package: {package['plan_name']}\n"
-                    f"💰 Amount: ₹{package['amount']}\n"
-                    f"⏱ Validity: {package['validity']} days"
-                ),
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            logger.error(f"Failed to notify admin {admin_id}: {e}")
+    # Same message for every admin - build it once and reuse the uploaded file_id
+    keyboard = [
+        [InlineKeyboardButton("✅ Approve", callback_data=f"approve_{pending_id}")],
+        [InlineKeyboardButton("❌ Reject", callback_data=f"reject_{pending_id}")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    caption = _SCREENSHOT_REVIEW_TEMPLATE.format_map({
+        'username': username,
+        'user_id': user_id,
+        'plan_name': package['plan_name'],
+        'amount': package['amount'],
+        'validity': package['validity']
+    })
+    
+    results = await asyncio.gather(
+        *(context.bot.send_photo(
+            chat_id=admin_id,
+            photo=file_id,
+            caption=caption,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        ) for admin_id in admins),
+        return_exceptions=True
+    )
+    
+    for admin_id, result in zip(admins, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify admin {admin_id}: {result}")
 
 async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Back to main menu"""
@@ -587,15 +625,87 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("❌ Cancelled!")
     return ConversationHandler.END
 
+# Config tables whose changes invalidate the matching in-process cache
+_CONFIG_CACHES = {
+    'admins': _ADMINS_CACHE,
+    'bot_settings': _SETTINGS_CACHE,
+    'upi_config': _UPI_CACHE,
+    'packages': _PACKAGE_CACHE
+}
+
+def _clear_on_change(table, clear_admin_cache):
+    """Realtime callback that drops the cached copies of a config table in both modules"""
+    def callback(payload):
+        _CONFIG_CACHES[table].clear()
+        clear_admin_cache(table)
+        logger.info(f"Config table '{table}' changed, cache cleared")
+    return callback
+
+def _on_subscribe_state(state, error):
+    """Log when the config channel fails to subscribe - TTLs keep the caches correct meanwhile"""
+    if state != RealtimeSubscribeStates.SUBSCRIBED:
+        logger.warning(f"Realtime config channel {state.value}, config caches will rely on TTL: {error}")
+
+async def start_config_listener(application):
+    """Subscribe to config table changes via Supabase Realtime - TTLs remain the fallback"""
+    from admin_commands import clear_cached_table
+    
+    client = None
+    try:
+        client = AsyncRealtimeClient(f"{SUPABASE_URL}/realtime/v1", SUPABASE_KEY, max_retries=3)
+        await client.connect()
+        channel = client.channel('config')
+        for table in _CONFIG_CACHES:
+            channel.on_postgres_changes('*', callback=_clear_on_change(table, clear_cached_table), table=table, schema='public')
+        await channel.subscribe(_on_subscribe_state)
+    except Exception as e:
+        logger.warning(f"Realtime unavailable, config caches will rely on TTL: {e}")
+        if client:
+            try:
+                await client.close()
+            except Exception as close_error:
+                logger.debug(f"Failed to close Realtime client: {close_error}")
+        return
+    
+    application.bot_data['realtime'] = client
+
+async def on_shutdown(application):
+    """Close the Realtime connection and shared HTTP clients on application shutdown"""
+    from admin_commands import close_http_client
+    
+    client = application.bot_data.get('realtime')
+    if client:
+        await client.close()
+    
+    await _HTTP.aclose()
+    await close_http_client(application)
+
 def main():
     """Start bot"""
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    from admin_commands import get_admin_handlers, on_config_change
+    
+    # Drop bot.py's cached copies as soon as an admin edits them from the panel
+    on_config_change('bot_settings', _SETTINGS_CACHE.clear)
+    on_config_change('upi_config', _UPI_CACHE.clear)
+    on_config_change('admins', invalidate_admins_cache)
+    
+    # Separate connection pools so long-polling can never starve outgoing replies
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .request(HTTPXRequest(connection_pool_size=TG_POOL_SIZE, pool_timeout=TG_POOL_TIMEOUT))
+        .get_updates_request(HTTPXRequest(connection_pool_size=TG_UPDATES_POOL_SIZE, pool_timeout=TG_POOL_TIMEOUT))
+        .rate_limiter(AIORateLimiter(overall_max_rate=25, overall_time_period=1, max_retries=3))
+        .post_init(start_config_listener)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Main conversation handler
     conv_handler = ConversationHandler(
         entry_points=[
             CallbackQueryHandler(generate_key_callback, pattern="^generate_key$"),
-            CallbackQueryHandler(select_package_callback, pattern="^select_pkg_")
+            CallbackQueryHandler(select_package_callback, pattern=P_SELECT_PKG)
         ],
         states={
             WAITING_TOKEN: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_token)],
@@ -616,8 +726,7 @@ def main():
     application.add_handler(CallbackQueryHandler(back_to_menu_callback, pattern="^back_to_menu$"))
     application.add_handler(conv_handler)
     
-    # Import and add admin handlers
-    from admin_commands import get_admin_handlers
+    # Add admin handlers
     for handler in get_admin_handlers():
         application.add_handler(handler)
     
@@ -635,7 +744,19 @@ def main():
     logger.info("  3. Set channel ID in bot_settings: -100123456789")
     logger.info("=" * 60)
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Webhook mode: Telegram pushes updates, so no connection is held open for getUpdates
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TELEGRAM_BOT_TOKEN}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=100,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,18 @@
+-- Replace the active UPI in a single transaction: deactivate the current
+-- row(s) and insert the new one, so there is never a window with no active UPI.
+create or replace function create_upi_rows(p_upi_id text, p_name text)
+returns upi_config
+language plpgsql
+as $$
+declare
+    new_row upi_config;
+begin
+    update upi_config set is_active = false where is_active = true;
+
+    insert into upi_config (upi_id, name, is_active, created_at)
+    values (p_upi_id, p_name, true, now())
+    returning * into new_row;
+
+    return new_row;
+end;
+$$;
@@ -0,0 +1,4 @@
+-- Screenshot approvals issue a key directly without creating a token, so
+-- keys need their own reference to the originating transaction.
+alter table keys add column if not exists source_transaction_id text;
+alter table keys alter column token_id drop not null;
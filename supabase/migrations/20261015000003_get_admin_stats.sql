@@ -0,0 +1,14 @@
+-- All admin dashboard counts in a single round-trip.
+create or replace function get_admin_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'users', (select count(*) from users),
+        'tokens', (select count(*) from tokens),
+        'active_tokens', (select count(*) from tokens where status = 'active'),
+        'keys', (select count(*) from keys),
+        'pending', (select count(*) from pending_transactions where status = 'pending')
+    )
+$$;
@@ -0,0 +1,37 @@
+-- Planner row estimate for large tables, exact count(*) for small or
+-- never-analyzed ones (reltuples is -1 until the first ANALYZE).
+create or replace function estimated_row_count(p_table regclass)
+returns bigint
+language plpgsql
+stable
+as $$
+declare
+    estimate bigint;
+    exact bigint;
+begin
+    select reltuples::bigint into estimate from pg_class where oid = p_table;
+
+    if estimate >= 10000 then
+        return estimate;
+    end if;
+
+    execute format('select count(*) from %s', p_table) into exact;
+    return exact;
+end;
+$$;
+
+-- Unfiltered totals use estimates; filtered counts stay exact since
+-- reltuples can't answer them.
+create or replace function get_admin_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'users', estimated_row_count('users'),
+        'tokens', estimated_row_count('tokens'),
+        'active_tokens', (select count(*) from tokens where status = 'active'),
+        'keys', estimated_row_count('keys'),
+        'pending', (select count(*) from pending_transactions where status = 'pending')
+    )
+$$;
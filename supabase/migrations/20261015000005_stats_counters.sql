@@ -0,0 +1,99 @@
+-- Trigger-maintained dashboard counters, so admin stats read five rows
+-- instead of counting whole tables.
+create table if not exists stats_counters (
+    metric text primary key,
+    value bigint not null default 0
+);
+
+create or replace function bump_stat(p_metric text, p_delta bigint)
+returns void
+language sql
+as $$
+    update stats_counters set value = value + p_delta where metric = p_metric;
+$$;
+
+-- tg_argv[0]: metric name
+create or replace function track_row_count()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'INSERT' then
+        perform bump_stat(tg_argv[0], 1);
+    elsif tg_op = 'DELETE' then
+        perform bump_stat(tg_argv[0], -1);
+    end if;
+    return null;
+end;
+$$;
+
+-- tg_argv[0]: metric name, tg_argv[1]: status value being counted
+create or replace function track_status_count()
+returns trigger
+language plpgsql
+as $$
+declare
+    delta bigint := 0;
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        if old.status = tg_argv[1] then
+            delta := delta - 1;
+        end if;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        if new.status = tg_argv[1] then
+            delta := delta + 1;
+        end if;
+    end if;
+
+    if delta <> 0 then
+        perform bump_stat(tg_argv[0], delta);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists users_count on users;
+create trigger users_count
+    after insert or delete on users
+    for each row execute function track_row_count('users');
+
+drop trigger if exists tokens_count on tokens;
+create trigger tokens_count
+    after insert or delete on tokens
+    for each row execute function track_row_count('tokens');
+
+drop trigger if exists tokens_active_count on tokens;
+create trigger tokens_active_count
+    after insert or update of status or delete on tokens
+    for each row execute function track_status_count('active_tokens', 'active');
+
+drop trigger if exists keys_count on keys;
+create trigger keys_count
+    after insert or delete on keys
+    for each row execute function track_row_count('keys');
+
+drop trigger if exists pending_count on pending_transactions;
+create trigger pending_count
+    after insert or update of status or delete on pending_transactions
+    for each row execute function track_status_count('pending', 'pending');
+
+-- Seed from the current data (the triggers above hold write locks until commit)
+insert into stats_counters (metric, value) values
+    ('users', (select count(*) from users)),
+    ('tokens', (select count(*) from tokens)),
+    ('active_tokens', (select count(*) from tokens where status = 'active')),
+    ('keys', (select count(*) from keys)),
+    ('pending', (select count(*) from pending_transactions where status = 'pending'))
+on conflict (metric) do update set value = excluded.value;
+
+create or replace function get_admin_stats()
+returns json
+language sql
+stable
+as $$
+    select json_object_agg(metric, value) from stats_counters
+$$;
+
+drop function if exists estimated_row_count(regclass);
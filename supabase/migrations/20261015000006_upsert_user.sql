@@ -0,0 +1,31 @@
+-- /start records the user in one round-trip and reports whether the row
+-- was newly inserted (xmax is 0 only for rows this statement created).
+
+-- The old select-then-insert could race and store a user twice; keep the
+-- most recently active row per user_id so the unique index can be built.
+delete from users u
+using users newer
+where newer.user_id = u.user_id
+  and (coalesce(newer.last_interaction, '-infinity'), newer.ctid)
+    > (coalesce(u.last_interaction, '-infinity'), u.ctid);
+
+create unique index if not exists users_user_id_key on users (user_id);
+
+create or replace function upsert_user(
+    p_user_id bigint,
+    p_username text,
+    p_first_name text,
+    p_last_name text
+)
+returns boolean
+language sql
+as $$
+    insert into users (user_id, username, first_name, last_name, last_interaction)
+    values (p_user_id, p_username, p_first_name, p_last_name, now())
+    on conflict (user_id) do update set
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        last_interaction = excluded.last_interaction
+    returning xmax = 0;
+$$;
@@ -0,0 +1,37 @@
+-- Turn an active token into a key in one transaction: insert the key and
+-- mark the token used together, so a failure can't leave one without the
+-- other. Returns null if the token is unknown, not the user's, or used.
+create extension if not exists pgcrypto with schema extensions;
+
+create or replace function redeem_token(p_token_id text, p_user_id bigint)
+returns text
+language plpgsql
+as $$
+declare
+    v_package_id bigint;
+    v_validity integer;
+    v_key text;
+begin
+    select t.package_id, p.validity into v_package_id, v_validity
+    from tokens t
+    join packages p on p.id = t.package_id
+    where t.token_id = p_token_id
+      and t.user_id = p_user_id
+      and t.status = 'active'
+    for update of t;
+
+    if not found then
+        return null;
+    end if;
+
+    -- URL-safe base64 without padding, like secrets.token_urlsafe(32)
+    v_key := translate(encode(extensions.gen_random_bytes(32), 'base64'), E'+/=\n', '-_');
+
+    insert into keys (key, user_id, package_id, token_id, validity_days, created_at, status)
+    values (v_key, p_user_id, v_package_id, p_token_id, v_validity, now(), 'active');
+
+    update tokens set status = 'used' where token_id = p_token_id;
+
+    return v_key;
+end;
+$$;
@@ -0,0 +1,21 @@
+-- Indexes for the filters the bot runs on every update, so lookups stay
+-- O(log n) as the tables grow. users.user_id is already unique (upsert_user).
+create unique index if not exists tokens_token_id_key on tokens (token_id);
+create index if not exists tokens_user_id_status_idx on tokens (user_id, status);
+create index if not exists keys_user_id_idx on keys (user_id);
+
+-- A payment may only be redeemed once. The old check-then-insert could race and
+-- store a transaction twice; keep the earliest token's claim and clear the id on
+-- the later ones (deleting them would orphan their keys) so the index can be built.
+update tokens t
+set transaction_id = null
+from tokens earlier
+where earlier.transaction_id = t.transaction_id
+  and (coalesce(earlier.created_at, '-infinity'), earlier.ctid)
+    < (coalesce(t.created_at, '-infinity'), t.ctid);
+
+create unique index if not exists tokens_transaction_id_key on tokens (transaction_id)
+    where transaction_id is not null;
+
+-- Matches get_all_packages: is_active = true order by amount
+create index if not exists packages_active_amount_idx on packages (amount) where is_active;
@@ -0,0 +1,16 @@
+-- Broadcast changes to config tables so running bots can drop their
+-- cached copies immediately instead of waiting for the TTL.
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['admins', 'bot_settings', 'upi_config', 'packages'] loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', t);
+        end if;
+    end loop;
+end;
+$$;
@@ -0,0 +1,8 @@
+-- Let Postgres stamp creation times so clients don't send them.
+alter table users alter column last_interaction set default now();
+alter table tokens alter column created_at set default now();
+alter table keys alter column created_at set default now();
+alter table pending_transactions alter column created_at set default now();
+alter table packages alter column created_at set default now();
+alter table admins alter column created_at set default now();
+alter table upi_config alter column created_at set default now();
@@ -0,0 +1,82 @@
+-- Single place that mints and stores a key, shared by both key-issuing RPCs.
+create or replace function new_key(
+    p_user_id bigint,
+    p_package_id bigint,
+    p_token_id text,
+    p_validity_days integer
+)
+returns text
+language plpgsql
+as $$
+declare
+    v_key text;
+begin
+    -- URL-safe base64 without padding, like secrets.token_urlsafe(32)
+    v_key := translate(encode(extensions.gen_random_bytes(32), 'base64'), E'+/=\n', '-_');
+
+    insert into keys (key, user_id, package_id, token_id, validity_days, status)
+    values (v_key, p_user_id, p_package_id, p_token_id, p_validity_days, 'active');
+
+    return v_key;
+end;
+$$;
+
+create or replace function redeem_token(p_token_id text, p_user_id bigint)
+returns text
+language plpgsql
+as $$
+declare
+    v_package_id bigint;
+    v_validity integer;
+begin
+    select t.package_id, p.validity into v_package_id, v_validity
+    from tokens t
+    join packages p on p.id = t.package_id
+    where t.token_id = p_token_id
+      and t.user_id = p_user_id
+      and t.status = 'active'
+    for update of t;
+
+    if not found then
+        return null;
+    end if;
+
+    update tokens set status = 'used' where token_id = p_token_id;
+
+    return new_key(p_user_id, v_package_id, p_token_id, v_validity);
+end;
+$$;
+
+-- A verified purchase: record the token as already used and issue its key
+-- in one round-trip. Returns null if the package doesn't exist or the
+-- transaction has already been redeemed.
+create or replace function issue_key(
+    p_user_id bigint,
+    p_username text,
+    p_package_id bigint,
+    p_transaction_id text,
+    p_amount numeric
+)
+returns text
+language plpgsql
+as $$
+declare
+    v_validity integer;
+    v_token_id text := encode(extensions.gen_random_bytes(16), 'hex');
+begin
+    select validity into v_validity from packages where id = p_package_id;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into tokens (token_id, user_id, username, package_id, transaction_id, amount, status)
+    values (v_token_id, p_user_id, p_username, p_package_id, p_transaction_id, p_amount, 'used');
+
+    return new_key(p_user_id, p_package_id, v_token_id, v_validity);
+exception
+    -- tokens_transaction_id_key: a concurrent request redeemed this transaction first
+    when unique_violation then
+        return null;
+end;
+$$;